@@ -0,0 +1,70 @@
+"""
+Backfills bucketed message storage from the per-message documents.
+
+Run from the `server` directory:
+
+    python -m app.backfill_message_buckets --user <uid> [--user <uid> ...]
+    python -m app.backfill_message_buckets --all
+
+Typical rollout:
+    1. Deploy with CHAT_STORAGE_MODE=dual. New messages are written in both formats.
+    2. Run this script with --all. Each backfilled user starts reading from buckets.
+    3. Once the Flutter client reads buckets, switch to CHAT_STORAGE_MODE=bucketed.
+
+The script is safe to re-run. In dual mode each user's buckets are rebuilt from
+the complete legacy documents. In bucketed mode new messages exist only in
+buckets, so legacy messages missing from them are appended and nothing is
+deleted; run it after switching to clear any heads that are not yet backfilled.
+"""
+import argparse
+import logging
+import sys
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+from .config import get_settings
+from .repositories import ChatRepository
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Backfill bucketed chat message storage.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--user", action="append", dest="users", help="UID of a user to backfill. Can be repeated.")
+    group.add_argument("--all", action="store_true", help="Backfill every user conversation.")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    if settings.chat_storage_mode == "legacy":
+        logger.error("Backfill requires the 'dual' or 'bucketed' storage mode (current mode: 'legacy').")
+        return 2
+
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(settings.firebase_service_account_key_path)
+        firebase_admin.initialize_app(cred)
+    db_client = firestore.client()
+
+    chat_repo = ChatRepository(db_client=db_client, settings=settings)
+
+    if args.all:
+        # list_documents() also returns conversation docs that only exist as a parent of subcollections.
+        user_ids = [ref.id for ref in db_client.collection(settings.firestore_conversations_collection).list_documents()]
+    else:
+        user_ids = args.users
+
+    failures = 0
+    total_messages = 0
+    for user_id in user_ids:
+        try:
+            total_messages += chat_repo.backfill_message_buckets(user_id)
+        except Exception as e:
+            failures += 1
+            logger.error("Backfill failed for user '%s': %s", user_id, e, exc_info=True)
+
+    logger.info("Backfilled %d messages for %d/%d users.", total_messages, len(user_ids) - failures, len(user_ids))
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
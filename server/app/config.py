@@ -1,5 +1,6 @@
 import os
 from functools import lru_cache
+from typing import Dict, Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 # Define the root directory of the 'server' application
@@ -12,6 +13,34 @@ class Settings(BaseSettings):
     # OpenAI API Key
     openai_api_key: str
 
+    # Registers the recurring reminder tool with the agent. Only enable once the
+    # notification dispatcher calls `rearm_recurring_reminder` after each delivery.
+    recurring_reminders_enabled: bool = False
+
+    # Logging settings
+    log_level: str = "INFO"
+    # Fraction of INFO-level records kept, per logger. WARNING and above are always kept.
+    log_sample_rates: Dict[str, float] = {
+        "app.repositories": 0.1,
+        "app.services.agent_service": 0.1,
+        "app.services.chat_service": 0.1,
+    }
+    log_queue_size: int = 10_000
+
+    # OpenAI HTTP client settings
+    openai_max_connections: int = 20
+    openai_max_keepalive_connections: int = 10
+    openai_keepalive_expiry: float = 60.0
+    openai_http2: bool = True
+    openai_connect_timeout: float = 5.0
+    openai_read_timeout: float = 60.0
+    openai_write_timeout: float = 10.0
+    openai_pool_timeout: float = 5.0
+    openai_max_retries: int = 2
+    # With HTTP/2 all warm-up requests share one multiplexed connection, so only one is made.
+    openai_warmup_connections: int = 2
+    openai_warmup_timeout: float = 5.0
+
     # Firebase settings
     firebase_service_account_key_path: str = os.path.join(
         SERVER_ROOT_DIR, 
@@ -22,6 +51,15 @@ class Settings(BaseSettings):
     firestore_users_collection: str = "users"
     firestore_conversations_collection: str = "user_conversations"
     firestore_messages_subcollection: str = "messages"
+    firestore_message_buckets_subcollection: str = "message_buckets"
+
+    # Chat message storage format:
+    # - "legacy": one document per message (what the Flutter client listens to).
+    # - "dual": write both formats; read buckets for users that have been backfilled.
+    # - "bucketed": write and read buckets only.
+    chat_storage_mode: Literal["legacy", "dual", "bucketed"] = "legacy"
+    message_bucket_max_messages: int = 200
+    message_bucket_max_bytes: int = 900_000
 
     # pydantic-settings configuration
     model_config = SettingsConfigDict(
@@ -0,0 +1,222 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Iterator
+
+# Request-scoped fields (uid, message_id, stage timings) attached to every record.
+_log_context: ContextVar[Dict[str, Any] | None] = ContextVar("log_context", default=None)
+
+_listener: QueueListener | None = None
+_queue_handler: logging.Handler | None = None
+
+# Loggers that uvicorn configures with their own synchronous handlers.
+_UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+_exception_formatter = logging.Formatter()
+
+# --- Request-scoped context ---
+
+def new_log_context(**fields: Any):
+    """
+    Starts a fresh logging context for the current request.
+
+    Returns:
+        A token to pass to `reset_log_context` when the request ends.
+    """
+    return _log_context.set(dict(fields))
+
+def reset_log_context(token) -> None:
+    """Restores the logging context that was active before `new_log_context`."""
+    _log_context.reset(token)
+
+def bind_log_context(**fields: Any) -> None:
+    """
+    Adds fields to the current logging context.
+    Has no effect outside of a context started with `new_log_context`.
+    """
+    context = _log_context.get()
+    if context is not None:
+        context.update(fields)
+
+@contextmanager
+def log_stage(name: str) -> Iterator[None]:
+    """
+    Times a block and records the duration under `timings` in the logging context.
+
+    Example:
+        with log_stage("agent"):
+            await agent_service.get_response(...)
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        context = _log_context.get()
+        if context is not None:
+            context.setdefault("timings", {})[name] = round((time.perf_counter() - started) * 1000, 1)
+
+# --- Handlers, filters and formatters ---
+
+class _ContextFilter(logging.Filter):
+    """Snapshots the request context onto the record in the emitting thread."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _log_context.get()
+        if context:
+            record.context = {**context, "timings": dict(context["timings"])} if "timings" in context else dict(context)
+        return True
+
+class _SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of INFO-and-below records for configured loggers.
+    WARNING and above, and records logged with `extra={"unsampled": True}`,
+    are never sampled out.
+    """
+    _rates: Dict[str, float]
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self._rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or getattr(record, "unsampled", False):
+            return True
+        rate = self._rates.get(record.name)
+        return rate is None or random.random() < rate
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """
+    A QueueHandler that never blocks the caller and defers JSON serialization and I/O.
+
+    When the queue is full, records are dropped and counted; the count is
+    reported with the next record that fits.
+    """
+    _dropped: int
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self._dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message now, so args mutated after the call can't change what is
+        # logged. Unlike the stdlib version, the full JSON formatting is left to the listener.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self._dropped:
+                record.dropped_records = self._dropped
+            self.queue.put_nowait(record)
+            self._dropped = 0
+        except queue.Full:
+            self._dropped += 1
+
+class _BlockingSentinelQueueListener(QueueListener):
+    """A QueueListener that waits for room in a bounded queue when stopping."""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single-line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        context = getattr(record, "context", None)
+        if context:
+            payload.update(context)
+        dropped = getattr(record, "dropped_records", None)
+        if dropped:
+            payload["dropped_records"] = dropped
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        elif record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+# --- Setup ---
+
+def configure_logging(level: str = "INFO", sample_rates: Dict[str, float] | None = None, queue_size: int = 10_000) -> None:
+    """
+    Routes all logging through a bounded queue drained by a background writer thread.
+
+    Records are filtered, sampled, tagged with request context and have their message
+    rendered in the calling thread, then serialized as JSON and written by the listener,
+    off the event loop. Uvicorn's loggers are routed through the same queue.
+
+    Args:
+        level: The root log level.
+        sample_rates: Fraction of INFO-and-below records to keep, per logger name.
+        queue_size: Maximum number of pending records before new ones are dropped.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(JsonFormatter())
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    queue_handler = _NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(_SamplingFilter(sample_rates or {}))
+    queue_handler.addFilter(_ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    _queue_handler = queue_handler
+
+    # Uvicorn attaches synchronous stream handlers with propagate=False, which would
+    # still write from the event loop; send their records to the root queue instead.
+    for name in _UVICORN_LOGGERS:
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+
+    _listener = _BlockingSentinelQueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+def shutdown_logging() -> None:
+    """
+    Flushes pending records and stops the background writer.
+
+    The queue handler is replaced with a synchronous JSON handler, so records logged
+    afterwards are still written. Calling `configure_logging` again restores the queue.
+    """
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+
+    root = logging.getLogger()
+    if _queue_handler is not None:
+        root.removeHandler(_queue_handler)
+        _queue_handler = None
+
+    _listener.stop()
+    _listener = None
+
+    fallback_handler = logging.StreamHandler()
+    fallback_handler.setFormatter(JsonFormatter())
+    root.addHandler(fallback_handler)
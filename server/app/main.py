@@ -1,22 +1,36 @@
 import logging
+import time
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 import firebase_admin
 from firebase_admin import credentials, auth, firestore
 
 from .config import get_settings
+from .logging_config import bind_log_context, configure_logging, new_log_context, reset_log_context, shutdown_logging
 from .models import ChatRequest, ChatResponse
+from .services.agent_service import AgentService, get_agent_service
 from .services.chat_service import ChatService, get_chat_service
 
-# --- Logging Configuration ---
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
 # --- App and Dependency Setup ---
 settings = get_settings()
 
+# --- Logging Configuration ---
+def setup_logging():
+    """Starts the queue-based logging pipeline. Does nothing if it is already running."""
+    configure_logging(
+        level=settings.log_level,
+        sample_rates=settings.log_sample_rates,
+        queue_size=settings.log_queue_size,
+    )
+    # The per-request summary record from `log_context_middleware` replaces uvicorn's access log.
+    logging.getLogger("uvicorn.access").disabled = True
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
 # --- Firebase Admin SDK Initialization ---
 try:
     # Check if the app is already initialized to prevent errors during hot-reloading
@@ -30,16 +44,54 @@ try:
     db_client = firestore.client()
 
 except Exception as e:
-    logger.critical(f"Failed to initialize Firebase Admin SDK: {e}", exc_info=True)
+    logger.critical("Failed to initialize Firebase Admin SDK: %s", e, exc_info=True)
     db_client = None # Ensure db_client is None if initialization fails
 
+# --- Application Lifespan ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Warms up the shared OpenAI connection pool on startup and closes it on shutdown.
+    Logging is (re)started here too, so it stays paired with `shutdown_logging`.
+    """
+    setup_logging()
+    agent_service = get_agent_service()
+    await agent_service.warm_up()
+    yield
+    await agent_service.close()
+    # The cached services hold the closed client; drop them so a later lifespan builds fresh ones.
+    get_chat_service.cache_clear()
+    get_agent_service.cache_clear()
+    shutdown_logging()
+
 # --- FastAPI App Instance ---
 app = FastAPI(
     title="ADHD App AI Backend",
     description="Handles AI responses for the ADHD companion app.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# --- Request-scoped Logging Context ---
+@app.middleware("http")
+async def log_context_middleware(request: Request, call_next):
+    """
+    Gives each request its own logging context, so fields bound while handling it
+    (uid, message_id, stage timings) are attached to every record it emits.
+    Ends each request with one unsampled summary record carrying all of them.
+    """
+    token = new_log_context(path=request.url.path, method=request.method)
+    started = time.perf_counter()
+    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        bind_log_context(status_code=status_code, duration_ms=round((time.perf_counter() - started) * 1000, 1))
+        logger.info("Request completed.", extra={"unsampled": True})
+        reset_log_context(token)
+
 # --- Authentication Dependency ---
 http_bearer_scheme = HTTPBearer(
     scheme_name="Firebase ID Token",
@@ -47,9 +99,9 @@ http_bearer_scheme = HTTPBearer(
     bearerFormat="JWT"
 )
 
-async def get_current_user_uid(auth_creds: HTTPAuthorizationCredentials = Depends(http_bearer_scheme)) -> str:
+async def get_decoded_token(auth_creds: HTTPAuthorizationCredentials = Depends(http_bearer_scheme)) -> dict:
     """
-    Dependency to validate Firebase ID token and return the user's UID.
+    Dependency to validate Firebase ID token and return its decoded claims.
     """
     if not auth_creds or auth_creds.scheme.lower() != "bearer":
         raise HTTPException(
@@ -63,13 +115,14 @@ async def get_current_user_uid(auth_creds: HTTPAuthorizationCredentials = Depend
     try:
         decoded_token = auth.verify_id_token(token)
         uid = decoded_token.get('uid')
+        bind_log_context(uid=uid)
         if not uid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="UID not found in token.",
                 headers={"WWW-Authenticate": "Bearer error=\"invalid_token\""},
             )
-        return uid
+        return decoded_token
     except auth.ExpiredIdTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -83,18 +136,43 @@ async def get_current_user_uid(auth_creds: HTTPAuthorizationCredentials = Depend
             headers={"WWW-Authenticate": "Bearer error=\"invalid_token\""},
         )
     except Exception as e:
-        logger.error(f"Unexpected error during token verification: {e}", exc_info=True)
+        logger.error("Unexpected error during token verification: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Could not verify authentication token due to an internal error."
         )
 
+async def get_current_user_uid(decoded_token: dict = Depends(get_decoded_token)) -> str:
+    """
+    Dependency to validate Firebase ID token and return the user's UID.
+    """
+    return decoded_token['uid']
+
+async def require_admin(decoded_token: dict = Depends(get_decoded_token)) -> str:
+    """
+    Dependency that only admits users with the `admin` custom claim.
+    """
+    if decoded_token.get('admin') is not True:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges are required.",
+        )
+    return decoded_token['uid']
+
 # --- API Endpoints ---
 @app.get("/")
 async def read_root():
     """A simple root endpoint to check if the server is running."""
     return {"message": "AI Backend is running!"}
 
+@app.get("/metrics/openai")
+async def read_openai_metrics(
+    admin_uid: str = Depends(require_admin),
+    agent_service: AgentService = Depends(get_agent_service),
+):
+    """Exposes OpenAI connection pool utilization and connect-time metrics to admins."""
+    return agent_service.get_connection_metrics()
+
 @app.post("/chat", response_model=ChatResponse)
 async def handle_chat(
     request: ChatRequest,
@@ -113,7 +191,7 @@ async def handle_chat(
         )
         return ChatResponse()
     except Exception as e:
-        logger.error(f"Error in /chat endpoint for user '{user_id}': {e}", exc_info=True)
+        logger.error("Error in /chat endpoint: %s", e, exc_info=True)
         # The specific error message will be logged on the server.
         # We return a generic error to the client.
         raise HTTPException(
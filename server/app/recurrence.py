@@ -0,0 +1,263 @@
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict
+from zoneinfo import ZoneInfo
+
+from dateutil.rrule import rrule, rrulestr
+from google.cloud.firestore_v1 import Transaction, transactional
+from google.cloud.firestore_v1.client import Client as FirestoreClient
+
+logger = logging.getLogger(__name__)
+
+# Reminders may not fire more often than this. Anything finer is almost
+# certainly a mistake and would flood the user's device.
+_MIN_OCCURRENCE_GAP = timedelta(hours=1)
+
+# Number of leading occurrences checked against the minimum gap.
+_GAP_CHECK_OCCURRENCES = 24
+
+# Format used to persist the local, wall-clock start of a rule.
+_LOCAL_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+# RFC 5545 UTC form of UNTIL, e.g. "UNTIL=20261231T000000Z".
+_UTC_UNTIL_PATTERN = re.compile(r"UNTIL=(\d{8}T\d{6})Z", re.IGNORECASE)
+_RRULE_DATETIME_FORMAT = "%Y%m%dT%H%M%S"
+
+_REMINDERS_COLLECTION = "scheduled_notifications"
+
+# --- Custom exceptions ---
+
+class RecurrenceError(ValueError):
+    """Custom exception for recurrence rule parsing and validation errors."""
+    pass
+
+# --- Public functions ---
+
+def parse_recurrence_rule(rule: str, dtstart_local: datetime, user_timezone: str) -> rrule:
+    """
+    Parses and validates an RRULE string anchored at a local, wall-clock start time.
+
+    Occurrences are expanded on naive local datetimes so that a reminder set for
+    "9am" stays at 9am across DST transitions. A UTC `UNTIL` ("...Z") is converted
+    to the user's wall-clock time to match.
+
+    Args:
+        rule (str): An RFC 5545 RRULE, e.g. "FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR".
+        dtstart_local (datetime): The first candidate occurrence in the user's local time.
+            Any tzinfo is dropped; only the wall-clock value is used.
+        user_timezone (str): The user's local timezone, used to convert a UTC `UNTIL`.
+
+    Returns:
+        rrule: The parsed rule.
+
+    Raises:
+        RecurrenceError: If the rule is malformed or not supported for reminders.
+    """
+    normalized = rule.strip()
+    if normalized.upper().startswith("RRULE:"):
+        normalized = normalized[len("RRULE:"):]
+
+    if not normalized:
+        raise RecurrenceError("The recurrence rule is empty.")
+    if "DTSTART" in normalized.upper():
+        raise RecurrenceError("Do not include DTSTART in the recurrence rule; it is derived from the start time.")
+
+    normalized = _UTC_UNTIL_PATTERN.sub(lambda m: _until_to_local(m.group(1), user_timezone), normalized)
+
+    try:
+        parsed = rrulestr(normalized, dtstart=dtstart_local.replace(tzinfo=None, microsecond=0))
+    except (ValueError, TypeError) as e:
+        raise RecurrenceError(f"Could not parse recurrence rule '{rule}': {e}") from e
+
+    if not isinstance(parsed, rrule):
+        raise RecurrenceError("Only a single RRULE is supported.")
+
+    _validate_min_gap(normalized, parsed)
+
+    return parsed
+
+def next_occurrence(parsed_rule: rrule, user_timezone: str, after_utc: datetime) -> datetime | None:
+    """
+    Returns the first occurrence of a rule strictly after the given instant.
+
+    Args:
+        parsed_rule (rrule): A rule returned by `parse_recurrence_rule`.
+        user_timezone (str): The user's local timezone (e.g., "America/Los_Angeles").
+        after_utc (datetime): A timezone-aware instant to search from.
+
+    Returns:
+        datetime | None: A timezone-aware UTC datetime, or None if the rule is exhausted.
+    """
+    tz = ZoneInfo(user_timezone)
+    # Start the search slightly early in wall-clock time: around a DST fall-back the
+    # same local time maps to two instants, so a naive comparison could skip one.
+    search_from = after_utc.astimezone(tz).replace(tzinfo=None) - timedelta(hours=3)
+
+    for candidate in parsed_rule.xafter(search_from, inc=False):
+        candidate_utc = _localize(candidate, tz).astimezone(timezone.utc)
+        if candidate_utc > after_utc:
+            return candidate_utc
+    return None
+
+def build_recurrence(rule: str, dtstart_local: datetime, user_timezone: str) -> tuple[Dict[str, Any], datetime]:
+    """
+    Validates a rule and returns the data to persist along with its first occurrence.
+
+    Args:
+        rule (str): An RFC 5545 RRULE string.
+        dtstart_local (datetime): The first candidate occurrence in the user's local time.
+        user_timezone (str): The user's local timezone.
+
+    Returns:
+        tuple[Dict[str, Any], datetime]: The `recurrence` field for the reminder document,
+            and the first occurrence as a timezone-aware UTC datetime.
+
+    Raises:
+        RecurrenceError: If the rule is invalid or has no future occurrences.
+    """
+    parsed_rule = parse_recurrence_rule(rule, dtstart_local, user_timezone)
+
+    first_utc = next_occurrence(parsed_rule, user_timezone, datetime.now(timezone.utc))
+    if first_utc is None:
+        raise RecurrenceError("The recurrence rule has no occurrences in the future.")
+
+    recurrence_data = {
+        "rrule": str(parsed_rule).split("\n")[-1].removeprefix("RRULE:"),
+        "dtstart": dtstart_local.strftime(_LOCAL_DATETIME_FORMAT),
+        "timezone": user_timezone,
+    }
+    return recurrence_data, first_utc
+
+def advance_recurring_reminder(reminder_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Computes the update that materializes the next occurrence of a recurring reminder.
+
+    Applied by `rearm_recurring_reminder` once the current occurrence has been
+    delivered. Only one occurrence is ever stored, so each rule costs a single
+    document regardless of how many times it fires.
+
+    Args:
+        reminder_data (Dict[str, Any]): The reminder document, including `recurrence`
+            and the `scheduledAt` of the occurrence that was just delivered.
+
+    Returns:
+        Dict[str, Any]: Fields to update on the reminder document. Either a new
+            `scheduledAt` with status "pending", or status "completed" if the rule is exhausted.
+    """
+    recurrence = reminder_data["recurrence"]
+    dtstart_local = datetime.strptime(recurrence["dtstart"], _LOCAL_DATETIME_FORMAT)
+    parsed_rule = parse_recurrence_rule(recurrence["rrule"], dtstart_local, recurrence["timezone"])
+
+    # Never schedule into the past, even if delivery ran late.
+    delivered_at: datetime = reminder_data["scheduledAt"]
+    after_utc = max(delivered_at, datetime.now(timezone.utc))
+
+    next_utc = next_occurrence(parsed_rule, recurrence["timezone"], after_utc)
+    if next_utc is None:
+        return {"status": "completed"}
+    return {"scheduledAt": next_utc, "status": "pending"}
+
+def rearm_recurring_reminder(db_client: FirestoreClient, reminder_id: str, delivered_scheduled_at: datetime) -> bool:
+    """
+    Re-arms a recurring reminder for its next occurrence after a delivery.
+
+    The notification dispatcher does not live in this repository. It must call this
+    function (or apply `advance_recurring_reminder` the same way) after delivering any
+    `scheduled_notifications` document that has a `recurrence` field; otherwise the
+    reminder fires once and stops.
+
+    Runs in a transaction and only advances the document if it is still scheduled for
+    the occurrence that was delivered, so repeated calls for the same delivery are no-ops.
+
+    Args:
+        db_client (FirestoreClient): The Firestore client.
+        reminder_id (str): The ID of the `scheduled_notifications` document.
+        delivered_scheduled_at (datetime): The `scheduledAt` value that was delivered.
+
+    Returns:
+        bool: True if the document was updated, False if it is not recurring, missing,
+            or was already advanced.
+    """
+    doc_ref = db_client.collection(_REMINDERS_COLLECTION).document(reminder_id)
+
+    @transactional
+    def _rearm(transaction: Transaction) -> bool:
+        snapshot = doc_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            return False
+
+        reminder_data = snapshot.to_dict()
+        if not reminder_data.get("recurrence") or reminder_data.get("scheduledAt") != delivered_scheduled_at:
+            return False
+
+        transaction.update(doc_ref, advance_recurring_reminder(reminder_data))
+        return True
+
+    return _rearm(db_client.transaction())
+
+# --- Private helper functions ----
+
+def _validate_min_gap(normalized_rule: str, parsed_rule: rrule) -> None:
+    """
+    Rejects rules that fire more often than hourly.
+
+    BYSECOND and multi-valued BYMINUTE are rejected outright, since they can expand
+    an hourly or daily rule into several occurrences per hour. The gaps between the
+    first occurrences are then checked, which catches sub-hourly frequencies.
+
+    Args:
+        normalized_rule (str): The rule string, without the "RRULE:" prefix.
+        parsed_rule (rrule): The parsed rule.
+
+    Raises:
+        RecurrenceError: If the rule can repeat more often than hourly.
+    """
+    parts = dict(part.split("=", 1) for part in normalized_rule.upper().split(";") if "=" in part)
+    if "BYSECOND" in parts or "," in parts.get("BYMINUTE", ""):
+        raise RecurrenceError("Reminders cannot repeat more often than hourly.")
+
+    previous = None
+    for index, occurrence in enumerate(parsed_rule):
+        if index >= _GAP_CHECK_OCCURRENCES:
+            break
+        if previous is not None and occurrence - previous < _MIN_OCCURRENCE_GAP:
+            raise RecurrenceError("Reminders cannot repeat more often than hourly.")
+        previous = occurrence
+
+def _until_to_local(until_utc: str, user_timezone: str) -> str:
+    """
+    Converts an RRULE UTC `UNTIL` value to the user's naive wall-clock time.
+
+    Args:
+        until_utc (str): The value without its "Z" suffix, e.g. "20261231T000000".
+        user_timezone (str): The user's local timezone.
+
+    Returns:
+        str: An `UNTIL=` rule part in local time.
+    """
+    parsed = datetime.strptime(until_utc, _RRULE_DATETIME_FORMAT).replace(tzinfo=timezone.utc)
+    local = parsed.astimezone(ZoneInfo(user_timezone)).replace(tzinfo=None)
+    return f"UNTIL={local.strftime(_RRULE_DATETIME_FORMAT)}"
+
+def _localize(naive_local: datetime, tz: ZoneInfo) -> datetime:
+    """
+    Attaches a timezone to a naive wall-clock datetime, resolving DST edge cases.
+
+    Ambiguous times (fall back) resolve to the first occurrence. Non-existent times
+    (spring forward) are shifted forward by the length of the gap, so "2:30am" on the
+    transition day fires at 3:30am rather than being skipped.
+
+    Args:
+        naive_local (datetime): A naive datetime in the user's wall-clock time.
+        tz (ZoneInfo): The user's timezone.
+
+    Returns:
+        datetime: A timezone-aware datetime in `tz`.
+    """
+    aware = naive_local.replace(tzinfo=tz, fold=0)
+    round_trip = aware.astimezone(timezone.utc).astimezone(tz)
+    if round_trip.replace(tzinfo=None) != naive_local:
+        # The wall-clock time does not exist; use the normalized instant.
+        return round_trip
+    return aware
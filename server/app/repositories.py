@@ -1,23 +1,45 @@
 import logging
+from datetime import datetime, timezone
 from typing import List, Dict, Any, Iterable
 
+from google.cloud.firestore_v1 import ArrayUnion, Increment, SERVER_TIMESTAMP, Transaction, transactional
+from google.cloud.firestore_v1.batch import WriteBatch
 from google.cloud.firestore_v1.client import Client as FirestoreClient
 from google.cloud.firestore_v1.collection import CollectionReference
 from google.cloud.firestore_v1.query import Query
-from google.cloud.firestore_v1.document import DocumentSnapshot
+from google.cloud.firestore_v1.document import DocumentReference, DocumentSnapshot
 
 from .config import Settings
 
 logger = logging.getLogger(__name__)
 
+# The head index lives alongside the buckets. It has no 'seq' field, so it is
+# naturally excluded from queries ordered by 'seq'.
+_BUCKET_HEAD_DOC_ID = "head"
+
+# Rough per-message overhead (field names, map framing) used when estimating bucket size.
+_BUCKET_ENTRY_OVERHEAD_BYTES = 64
+
+# Firestore allows at most 500 writes per batch.
+_MAX_BATCH_WRITES = 500
+
 class ChatRepository:
     """
     Handles all database operations related to chat messages in Firestore.
+
+    Messages are stored either as one document per message ("legacy"), or appended
+    into bucket documents holding up to N messages each ("bucketed"), indexed by a
+    small head document. The "dual" mode writes both formats so the Flutter client's
+    listeners on the legacy collection keep working during rollout.
     """
     _db: FirestoreClient
     _users_collection: str
     _conversations_collection: str
     _messages_subcollection: str
+    _buckets_subcollection: str
+    _storage_mode: str
+    _bucket_max_messages: int
+    _bucket_max_bytes: int
 
     def __init__(self, db_client: FirestoreClient, settings: Settings):
         """
@@ -27,26 +49,30 @@ class ChatRepository:
         self._users_collection = settings.firestore_users_collection
         self._conversations_collection = settings.firestore_conversations_collection
         self._messages_subcollection = settings.firestore_messages_subcollection
+        self._buckets_subcollection = settings.firestore_message_buckets_subcollection
+        self._storage_mode = settings.chat_storage_mode
+        self._bucket_max_messages = settings.message_bucket_max_messages
+        self._bucket_max_bytes = settings.message_bucket_max_bytes
 
     def get_message_history(self, user_id: str) -> List[Dict[str, Any]]:
         """
         Retrieves the message history for a given user, ordered by timestamp.
+
+        Reads from buckets when the storage mode allows it and the user has a bucket
+        head, otherwise from the per-message documents.
         """
         try:
-            messages_ref: CollectionReference = self._db.collection(self._conversations_collection) \
-                .document(user_id) \
-                .collection(self._messages_subcollection)
-            
-            query: Query = messages_ref.order_by('timestamp', direction=Query.ASCENDING)
-            
-            docs: Iterable[DocumentSnapshot] = query.stream()
-            
-            history: List[Dict[str, Any]] = [doc.to_dict() for doc in docs]
-            
-            logger.info(f"Fetched {len(history)} messages for user '{user_id}'.")
+            history: List[Dict[str, Any]] | None = None
+            if self._storage_mode != "legacy":
+                history = self._get_bucketed_history(user_id)
+
+            if history is None:
+                history = self._get_legacy_history(user_id)
+
+            logger.info("Fetched %d messages.", len(history))
             return history
         except Exception as e:
-            logger.error(f"Could not fetch message history for user '{user_id}': {e}", exc_info=True)
+            logger.error("Could not fetch message history: %s", e, exc_info=True)
             raise
 
     def add_messages(self, user_id: str, messages: List[Dict[str, Any]]):
@@ -56,29 +82,53 @@ class ChatRepository:
         """
         try:
             batch = self._db.batch()
-            user_messages_ref: CollectionReference = self._db.collection(self._conversations_collection) \
-                .document(user_id) \
-                .collection(self._messages_subcollection)
-
-            for message in messages:
-                message_id = message.get("id")
-                message_data = message.get("data", {})
-
-                if message_id:
-                    # Use the provided ID for the document reference
-                    doc_ref = user_messages_ref.document(message_id)
-                else:
-                    # Let Firestore auto-generate the ID
-                    doc_ref = user_messages_ref.document()
-                
-                batch.set(doc_ref, message_data)
-            
+            self.add_messages_to_batch(batch, user_id, messages)
             batch.commit()
-            logger.info(f"Successfully added {len(messages)} new messages for user '{user_id}'.")
+            logger.info("Successfully added %d new messages.", len(messages))
         except Exception as e:
-            logger.error(f"Could not add messages for user '{user_id}': {e}", exc_info=True)
+            logger.error("Could not add messages: %s", e, exc_info=True)
             raise
 
+    def add_messages_to_batch(self, batch: WriteBatch, user_id: str, messages: List[Dict[str, Any]]):
+        """
+        Adds the writes for new messages to an existing Firestore batch, in the
+        format(s) required by the current storage mode.
+        Each message in the list can optionally specify an 'id'.
+        """
+        user_messages_ref = self._legacy_messages_ref(user_id)
+
+        # Resolve IDs up front so both formats agree on them in dual mode.
+        resolved: List[Dict[str, Any]] = []
+        for message in messages:
+            # Let Firestore auto-generate the ID if none was provided
+            message_id = message.get("id") or user_messages_ref.document().id
+            resolved.append({"id": message_id, "data": message.get("data", {})})
+
+        if self._storage_mode in ("legacy", "dual"):
+            for message in resolved:
+                batch.set(user_messages_ref.document(message["id"]), message["data"])
+
+        if self._storage_mode in ("dual", "bucketed"):
+            self._append_to_buckets(batch, user_id, resolved)
+
+    def backfill_message_buckets(self, user_id: str, max_attempts: int = 3) -> int:
+        """
+        Brings a user's message buckets up to date with their per-message documents
+        and marks the head as backfilled, which enables bucket-only reads.
+
+        In dual mode the legacy documents are complete, so the buckets are rebuilt
+        from them. In bucketed mode new messages exist only in buckets, so legacy
+        messages missing from the buckets are appended instead; nothing is deleted.
+
+        Returns:
+            The number of messages written into buckets.
+        """
+        if self._storage_mode == "dual":
+            return self._rebuild_buckets(user_id, max_attempts)
+        if self._storage_mode == "bucketed":
+            return self._merge_legacy_into_buckets(user_id)
+        raise RuntimeError("Backfill requires the 'dual' or 'bucketed' storage mode (current mode: 'legacy').")
+
     def get_user_profile(self, user_id: str) -> Dict[str, Any] | None:
         """
         Retrieves the user profile document from Firestore.
@@ -87,13 +137,13 @@ class ChatRepository:
             doc_ref = self._db.collection(self._users_collection).document(user_id)
             doc = doc_ref.get()
             if doc.exists:
-                logger.info(f"Fetched profile for user: '{user_id}'.")
+                logger.info("Fetched user profile.")
                 return doc.to_dict()
             else:
-                logger.warning(f"User profile document not found for user '{user_id}'.")
+                logger.warning("User profile document not found.")
                 return None
         except Exception as e:
-            logger.error(f"Could not fetch user profile for user '{user_id}': {e}", exc_info=True)
+            logger.error("Could not fetch user profile: %s", e, exc_info=True)
             raise
 
     def get_user_fcm_tokens(self, user_id: str) -> list[str]:
@@ -101,15 +151,287 @@ class ChatRepository:
             user_doc_ref = self._db.collection(self._users_collection).document(user_id)
             user_doc = user_doc_ref.get()
             if not user_doc.exists:
-                logger.warning(f"User document not found for user_id: {user_id}")
+                logger.warning("User document not found.")
                 return []
             
             user_data = user_doc.to_dict()
             tokens = user_data.get("fcmTokens", [])
             if not isinstance(tokens, list):
-                logger.warning(f"fcmTokens field is not a list for user_id: {user_id}")
+                logger.warning("fcmTokens field is not a list.")
                 return []
             return tokens
         except Exception as e:
-            logger.error(f"Error fetching FCM tokens for user_id: '{user_id}")
-            return []
\ No newline at end of file
+            logger.error("Error fetching FCM tokens: %s", e)
+            return []
+
+    # --- Private helpers ---
+
+    def _legacy_messages_ref(self, user_id: str) -> CollectionReference:
+        return self._db.collection(self._conversations_collection) \
+            .document(user_id) \
+            .collection(self._messages_subcollection)
+
+    def _buckets_ref(self, user_id: str) -> CollectionReference:
+        return self._db.collection(self._conversations_collection) \
+            .document(user_id) \
+            .collection(self._buckets_subcollection)
+
+    def _bucket_head_ref(self, user_id: str) -> DocumentReference:
+        return self._buckets_ref(user_id).document(_BUCKET_HEAD_DOC_ID)
+
+    def _get_legacy_history(self, user_id: str) -> List[Dict[str, Any]]:
+        query: Query = self._legacy_messages_ref(user_id).order_by('timestamp', direction=Query.ASCENDING)
+        docs: Iterable[DocumentSnapshot] = query.stream()
+        return [doc.to_dict() for doc in docs]
+
+    def _get_bucketed_history(self, user_id: str) -> List[Dict[str, Any]] | None:
+        """
+        Returns the history from buckets, or None if the caller should read the
+        legacy format instead.
+
+        Buckets are only trusted on their own once the head is marked backfilled.
+        The full history is read, as in legacy mode, so the agent sees the same
+        conversation whichever format is active; that costs 1 + N / bucket size reads.
+        """
+        head = self._bucket_head_ref(user_id).get()
+        if not head.exists:
+            return None
+
+        backfilled = head.to_dict().get("backfilled", False)
+        if not backfilled and self._storage_mode == "dual":
+            # Dual mode keeps writing legacy documents, so they are still complete.
+            return None
+
+        query: Query = self._buckets_ref(user_id).order_by('seq', direction=Query.ASCENDING)
+        history: List[Dict[str, Any]] = []
+        for bucket in query.stream():
+            history.extend(bucket.to_dict().get("messages", []))
+
+        if not backfilled:
+            # In bucketed mode, a user who was never backfilled has older messages only in
+            # the legacy format and newer ones only in buckets, so combine the two. Running
+            # the backfill script merges them into the buckets and ends this costlier path.
+            bucket_ids = {message.get("id") for message in history}
+            for doc in self._legacy_messages_ref(user_id).stream():
+                if doc.id not in bucket_ids:
+                    history.append({"id": doc.id, **doc.to_dict()})
+
+        # Concurrent turns may append out of order; match the legacy timestamp ordering.
+        history.sort(key=lambda m: m.get("timestamp") or datetime.min.replace(tzinfo=timezone.utc))
+        return history
+
+    def _append_to_buckets(self, batch: WriteBatch, user_id: str, messages: List[Dict[str, Any]]):
+        """
+        Appends messages to the user's latest bucket, rolling over to a new bucket
+        when the message or size limit would be exceeded.
+        """
+        entries = [self._to_bucket_entry(m["id"], m["data"]) for m in messages]
+        added_bytes = sum(self._estimate_entry_bytes(e) for e in entries)
+
+        seq = self._reserve_bucket_space(user_id, len(entries), added_bytes)
+
+        bucket_ref = self._buckets_ref(user_id).document(self._bucket_doc_id(seq))
+        batch.set(bucket_ref, {
+            "seq": seq,
+            "messages": ArrayUnion(entries),
+            "count": Increment(len(entries)),
+            "bytes": Increment(added_bytes),
+        }, merge=True)
+
+    def _reserve_bucket_space(self, user_id: str, message_count: int, message_bytes: int) -> int:
+        """
+        Reserves room for new messages in the head index and returns the bucket to use.
+
+        The head is read and updated in a transaction, so concurrent turns see each
+        other's reservations and rollover is decided from current counts. The
+        reservation commits before the chat batch; if the batch then fails, the head
+        over-counts, which only makes the next rollover happen earlier.
+        """
+        head_ref = self._bucket_head_ref(user_id)
+
+        @transactional
+        def reserve(transaction: Transaction) -> int:
+            snapshot = head_ref.get(transaction=transaction)
+            if not snapshot.exists:
+                # A user with no legacy messages has nothing to backfill, so their
+                # buckets are complete from the first write.
+                transaction.set(head_ref, {
+                    "latestSeq": 0,
+                    "latestCount": message_count,
+                    "latestBytes": message_bytes,
+                    "backfilled": self._count_legacy_messages(user_id) == 0,
+                })
+                return 0
+
+            head = snapshot.to_dict()
+            seq = head.get("latestSeq", 0)
+            count = head.get("latestCount", 0)
+            size = head.get("latestBytes", 0)
+            if count and (count + message_count > self._bucket_max_messages or size + message_bytes > self._bucket_max_bytes):
+                seq, count, size = seq + 1, 0, 0
+
+            transaction.update(head_ref, {
+                "latestSeq": seq,
+                "latestCount": count + message_count,
+                "latestBytes": size + message_bytes,
+            })
+            return seq
+
+        return reserve(self._db.transaction())
+
+    def _rebuild_buckets(self, user_id: str, max_attempts: int) -> int:
+        """
+        Rebuilds a user's buckets from scratch out of the legacy documents (dual mode).
+
+        The head is marked backfilled in a transaction that also re-checks the legacy
+        count and the head's reservation counters. If a chat turn wrote messages or
+        reserved bucket space while the rebuild ran, the rebuild is retried.
+        """
+        head_ref = self._bucket_head_ref(user_id)
+
+        for attempt in range(1, max_attempts + 1):
+            # Route dual-mode reads back to the legacy format while we rebuild.
+            head_ref.set({"backfilled": False}, merge=True)
+            start_head = head_ref.get().to_dict() or {}
+
+            docs = list(self._legacy_messages_ref(user_id).order_by('timestamp', direction=Query.ASCENDING).stream())
+            entries = [self._to_bucket_entry(doc.id, doc.to_dict()) for doc in docs]
+
+            self._delete_buckets(user_id)
+            rebuilt_head = self._write_buckets(user_id, entries)
+
+            if self._finish_rebuild(user_id, start_head, rebuilt_head, len(entries)):
+                logger.info("Backfilled %d messages into buckets for user '%s'.", len(entries), user_id)
+                return len(entries)
+
+            logger.warning("Messages changed during backfill for user '%s' (attempt %d). Retrying.", user_id, attempt)
+
+        raise RuntimeError(f"Could not backfill message buckets for user '{user_id}' after {max_attempts} attempts.")
+
+    def _finish_rebuild(self, user_id: str, start_head: Dict[str, Any], rebuilt_head: Dict[str, Any], expected_count: int) -> bool:
+        """
+        Atomically installs the rebuilt head, unless a concurrent turn has touched the
+        head or the legacy messages since the rebuild started.
+        """
+        head_ref = self._bucket_head_ref(user_id)
+
+        @transactional
+        def finish(transaction: Transaction) -> bool:
+            current = head_ref.get(transaction=transaction).to_dict() or {}
+            if (current.get("latestSeq"), current.get("latestCount")) != (start_head.get("latestSeq"), start_head.get("latestCount")):
+                return False
+            if self._count_legacy_messages(user_id) != expected_count:
+                return False
+            transaction.set(head_ref, {**rebuilt_head, "backfilled": True})
+            return True
+
+        return finish(self._db.transaction())
+
+    def _merge_legacy_into_buckets(self, user_id: str) -> int:
+        """
+        Appends legacy messages that are missing from a user's buckets (bucketed mode).
+
+        Uses the same reservation path as chat turns, so it is safe while turns are
+        live. Legacy documents are no longer written in this mode, so one pass is enough.
+        """
+        bucket_ids = set()
+        for bucket in self._buckets_ref(user_id).order_by('seq').stream():
+            bucket_ids.update(message.get("id") for message in bucket.to_dict().get("messages", []))
+
+        missing = [
+            {"id": doc.id, "data": doc.to_dict()}
+            for doc in self._legacy_messages_ref(user_id).order_by('timestamp', direction=Query.ASCENDING).stream()
+            if doc.id not in bucket_ids
+        ]
+
+        # Append in chunks that fit in a single bucket.
+        chunk: List[Dict[str, Any]] = []
+        chunk_bytes = 0
+        for message in missing:
+            message_bytes = self._estimate_entry_bytes(self._to_bucket_entry(message["id"], message["data"]))
+            if chunk and (len(chunk) >= self._bucket_max_messages or chunk_bytes + message_bytes > self._bucket_max_bytes):
+                self._commit_bucket_append(user_id, chunk)
+                chunk, chunk_bytes = [], 0
+            chunk.append(message)
+            chunk_bytes += message_bytes
+        if chunk:
+            self._commit_bucket_append(user_id, chunk)
+
+        self._bucket_head_ref(user_id).set({"backfilled": True}, merge=True)
+        logger.info("Merged %d legacy messages into buckets for user '%s'.", len(missing), user_id)
+        return len(missing)
+
+    def _commit_bucket_append(self, user_id: str, messages: List[Dict[str, Any]]):
+        batch = self._db.batch()
+        self._append_to_buckets(batch, user_id, messages)
+        batch.commit()
+
+    def _write_buckets(self, user_id: str, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Writes entries into freshly numbered buckets and returns the head fields
+        describing the latest one.
+        """
+        buckets: List[List[Dict[str, Any]]] = [[]]
+        sizes: List[int] = [0]
+        for entry in entries:
+            entry_bytes = self._estimate_entry_bytes(entry)
+            if buckets[-1] and (len(buckets[-1]) >= self._bucket_max_messages or sizes[-1] + entry_bytes > self._bucket_max_bytes):
+                buckets.append([])
+                sizes.append(0)
+            buckets[-1].append(entry)
+            sizes[-1] += entry_bytes
+
+        buckets_ref = self._buckets_ref(user_id)
+        # Each bucket can approach 1MB and a commit is limited to 10MB, so commit in small groups.
+        for start in range(0, len(buckets), 8):
+            batch = self._db.batch()
+            for seq in range(start, min(start + 8, len(buckets))):
+                batch.set(buckets_ref.document(self._bucket_doc_id(seq)), {
+                    "seq": seq,
+                    "messages": buckets[seq],
+                    "count": len(buckets[seq]),
+                    "bytes": sizes[seq],
+                })
+            batch.commit()
+
+        return {
+            "latestSeq": len(buckets) - 1,
+            "latestCount": len(buckets[-1]),
+            "latestBytes": sizes[-1],
+        }
+
+    def _delete_buckets(self, user_id: str):
+        """
+        Deletes all bucket documents for a user, leaving the head in place.
+        """
+        refs = [ref for ref in self._buckets_ref(user_id).list_documents() if ref.id != _BUCKET_HEAD_DOC_ID]
+        for start in range(0, len(refs), _MAX_BATCH_WRITES):
+            batch = self._db.batch()
+            for ref in refs[start:start + _MAX_BATCH_WRITES]:
+                batch.delete(ref)
+            batch.commit()
+
+    def _count_legacy_messages(self, user_id: str) -> int:
+        result = self._legacy_messages_ref(user_id).count().get()
+        return int(result[0][0].value)
+
+    @staticmethod
+    def _bucket_doc_id(seq: int) -> str:
+        # Zero-padded so document IDs sort in bucket order.
+        return f"{seq:08d}"
+
+    @staticmethod
+    def _to_bucket_entry(message_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        entry = {"id": message_id, **data}
+        # Server timestamps are not allowed inside arrays, so resolve them locally.
+        if entry.get("timestamp") is SERVER_TIMESTAMP:
+            entry["timestamp"] = datetime.now(timezone.utc)
+        return entry
+
+    @staticmethod
+    def _estimate_entry_bytes(entry: Dict[str, Any]) -> int:
+        size = _BUCKET_ENTRY_OVERHEAD_BYTES
+        for key, value in entry.items():
+            size += len(key) + 1
+            size += len(value.encode("utf-8")) + 1 if isinstance(value, str) else 8
+        return size
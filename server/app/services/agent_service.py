@@ -1,10 +1,11 @@
 import logging
 from functools import lru_cache
 from firebase_admin import firestore
-from agents import Agent, Runner, TResponseInputItem, set_default_openai_key
+from agents import Agent, OpenAIResponsesModel, Runner, TResponseInputItem, set_default_openai_key
 
-from app.config import get_settings
-from ..tools.reminder_tool import schedule_reminder
+from app.config import Settings, get_settings
+from .openai_client import OpenAIClientManager
+from ..tools.reminder_tool import schedule_reminder, schedule_recurring_reminder
 from ..models import AgentContext
 
 logger = logging.getLogger(__name__)
@@ -39,29 +40,56 @@ Tool use:
 - When a user asks to be reminded of something, invoke the `schedule_reminder` tool.
 """
 
+# Appended to the instructions when recurring reminders are enabled.
+_RECURRING_REMINDER_INSTRUCTIONS = """- When a user asks for a repeating reminder (e.g. "every weekday at 9am"), invoke the `schedule_recurring_reminder` tool once with an RRULE. Do not call `schedule_reminder` repeatedly.
+"""
+
 class AgentService:
     """
     A service class to encapsulate the AI agent's logic and interaction.
     """
     _agent: Agent[AgentContext]
+    _openai: OpenAIClientManager
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, settings: Settings):
         """
         Initializes the AgentService.
 
         Args:
             api_key: The OpenAI API key.
+            settings: Application settings for the OpenAI HTTP client and enabled tools.
         """
+        # Still needed so the SDK can export traces.
         set_default_openai_key(api_key)
+
+        self._openai = OpenAIClientManager(api_key=api_key, settings=settings)
+
+        instructions = _ADHD_COACH_INSTRUCTIONS
+        tools = [schedule_reminder]
+        if settings.recurring_reminders_enabled:
+            instructions += _RECURRING_REMINDER_INSTRUCTIONS
+            tools.append(schedule_recurring_reminder)
         
         self._agent = Agent[AgentContext](
             name="ADHD_Coach_Agent",
-            instructions=_ADHD_COACH_INSTRUCTIONS,
-            model="gpt-4o",
-            tools=[schedule_reminder],
+            instructions=instructions,
+            model=OpenAIResponsesModel(model="gpt-4o", openai_client=self._openai.client),
+            tools=tools,
         )
         logger.info("AI Agent initialized.")
 
+    async def warm_up(self) -> None:
+        """Pre-opens connections to the OpenAI API."""
+        await self._openai.warm_up()
+
+    async def close(self) -> None:
+        """Closes the pooled OpenAI connections."""
+        await self._openai.aclose()
+
+    def get_connection_metrics(self) -> dict:
+        """Returns OpenAI connection pool utilization and connect-time metrics."""
+        return self._openai.get_metrics()
+
     async def get_response(
         self,
         conversation_history: list[TResponseInputItem],
@@ -77,7 +105,7 @@ class AgentService:
                 firestore_batch=batch,
             )
 
-            logger.info(f"Running agent with {len(conversation_history)} messages in history.")
+            logger.info("Running agent with %d messages in history.", len(conversation_history))
             result = await Runner.run(self._agent, conversation_history, context=agent_context)
             
             final_output = result.final_output
@@ -87,11 +115,11 @@ class AgentService:
             else:
                 # This case might happen if the agent's output is misconfigured.
                 # We'll log it and return a generic response.
-                logger.warning(f"Agent returned an unexpected type: {type(final_output)}. Converting to string.")
+                logger.warning("Agent returned an unexpected type: %s. Converting to string.", type(final_output))
                 return str(final_output)
 
         except Exception as e:
-            logger.error(f"Error running AI agent: {e}", exc_info=True)
+            logger.error("Error running AI agent: %s", e, exc_info=True)
             # Provide a fallback response in case of an error.
             return "I'm having a little trouble connecting right now. Please try again in a moment."
 
@@ -105,4 +133,4 @@ def get_agent_service() -> AgentService:
     Uses lru_cache to ensure a single instance of the service is created.
     """
     settings = get_settings()
-    return AgentService(api_key=settings.openai_api_key)
\ No newline at end of file
+    return AgentService(api_key=settings.openai_api_key, settings=settings)
\ No newline at end of file
@@ -7,6 +7,7 @@ from firebase_admin import firestore
 from agents import TResponseInputItem
 
 from ..config import get_settings
+from ..logging_config import bind_log_context, log_stage
 from ..repositories import ChatRepository
 from ..services.agent_service import AgentService, get_agent_service
 from ..services.notification_service import NotificationService, get_notification_service
@@ -49,22 +50,26 @@ class ChatService:
     ):
         db = firestore.client()
         batch = db.batch()
+        bind_log_context(uid=user_id, message_id=client_message_id)
 
         try:
-            user_profile = self._chat_repo.get_user_profile(user_id)
+            with log_stage("profile"):
+                user_profile = self._chat_repo.get_user_profile(user_id)
             user_timezone = user_profile.get("timezone", "UTC") if user_profile else "UTC"
             
-            history_docs = self._chat_repo.get_message_history(user_id)
+            with log_stage("history"):
+                history_docs = self._chat_repo.get_message_history(user_id)
             conversation_history = self._format_history_for_agent(history_docs)
             conversation_history.append({"role": "user", "content": user_message})
 
-            logger.info(f"Generating AI response for user '{user_id}'.")
-            ai_response_text = await self._agent_service.get_response(
-                conversation_history=conversation_history,
-                user_id=user_id,
-                user_timezone=user_timezone,
-                batch=batch,
-            )
+            logger.info("Generating AI response.")
+            with log_stage("agent"):
+                ai_response_text = await self._agent_service.get_response(
+                    conversation_history=conversation_history,
+                    user_id=user_id,
+                    user_timezone=user_timezone,
+                    batch=batch,
+                )
 
             user_message_payload = {
                 "text": user_message,
@@ -78,33 +83,29 @@ class ChatService:
                 "timestamp": firestore.SERVER_TIMESTAMP,
             }
 
-            messages_collection_ref = db.collection(self._chat_repo._conversations_collection).document(user_id).collection(self._chat_repo._messages_subcollection)
-            user_msg_ref = messages_collection_ref.document(client_message_id)
-            ai_msg_ref = messages_collection_ref.document()
-
-            batch.set(user_msg_ref, user_message_payload)
-            batch.set(ai_msg_ref, ai_message_payload)
+            self._chat_repo.add_messages_to_batch(batch, user_id, [
+                {"id": client_message_id, "data": user_message_payload},
+                {"data": ai_message_payload},
+            ])
 
-            batch.commit()
-            logger.info(f"Successfully committed chat batch to Firestore.")
+            with log_stage("commit"):
+                batch.commit()
+            logger.info("Successfully committed chat batch to Firestore.")
 
-            logger.info(f"Attempting to send notification to user '{user_id}'.")
-            fcm_tokens = self._chat_repo.get_user_fcm_tokens(user_id)
-            if fcm_tokens:
-                self._notification_service.send_notification_to_devices(
-                    tokens=fcm_tokens,
-                    title="You have a new message!",
-                    body=ai_response_text[:100] + ('...' if len(ai_response_text) > 100 else '')
-                )
-            else:
-                logger.info(f"User '{user_id}' has no FCM notkens. Skipping notification.")
+            with log_stage("notify"):
+                fcm_tokens = self._chat_repo.get_user_fcm_tokens(user_id)
+                if fcm_tokens:
+                    self._notification_service.send_notification_to_devices(
+                        tokens=fcm_tokens,
+                        title="You have a new message!",
+                        body=ai_response_text[:100] + ('...' if len(ai_response_text) > 100 else '')
+                    )
+                else:
+                    logger.info("User has no FCM tokens. Skipping notification.")
 
 
         except Exception as e:
-            logger.error(
-                f"An error occurred in ChatService for user '{user_id}': {e}",
-                exc_info=True,
-            )
+            logger.error("An error occurred in ChatService: %s", e, exc_info=True)
             # In a real-world scenario, you might want to save an error message
             # to Firestore or notify the user in some way. For now, we just log it.
             raise # Re-raise the exception to be handled by the API endpoint
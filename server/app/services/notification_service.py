@@ -37,12 +37,12 @@ class NotificationService:
             response: messaging.BatchResponse = messaging.send_each_for_multicast(message)
             
             # Log the results
-            logger.info(f"{response.success_count} messages were sent successfully.")
+            logger.info("%d messages were sent successfully.", response.success_count)
             if response.failure_count > 0:
                 self._log_failed_sends(response, tokens)
 
         except Exception as e:
-            logger.error(f"An unexpected error occurred while sending FCM message: {e}", exc_info=True)
+            logger.error("An unexpected error occurred while sending FCM message: %s", e, exc_info=True)
 
     def _log_failed_sends(self, response: messaging.BatchResponse, tokens: List[str]):
         """
@@ -55,15 +55,16 @@ class NotificationService:
             if not resp.success:
                 # The order of responses corresponds to the order of the registration tokens.
                 failed_tokens.append(tokens[idx])
-                # Log the specific error for each failed token
+                # Log the specific error for each failed token. Only a prefix of the
+                # token is logged; the full value is a device credential.
                 error_code = resp.exception.code if resp.exception else 'UNKNOWN_ERROR'
                 logger.warning(
-                    f"Message sent to token '{tokens[idx]}' failed with error code: {error_code}"
+                    "Message sent to token '%s...' failed with error code: %s", tokens[idx][:8], error_code
                 )
         
         # You could also implement logic here to remove these failed_tokens from your database.
         # For now, we are just logging them.
-        logger.warning(f"List of tokens that caused failures: {failed_tokens}")
+        logger.warning("%d of %d tokens caused failures.", len(failed_tokens), len(tokens))
 
 
 # --- Dependency Injection ---
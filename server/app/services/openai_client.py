@@ -0,0 +1,202 @@
+import asyncio
+import importlib.util
+import logging
+import time
+from typing import Any, Dict
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+from ..config import Settings
+
+logger = logging.getLogger(__name__)
+
+class ConnectionMetrics:
+    """
+    Collects connection setup timings for the OpenAI HTTP client.
+
+    Timings come from httpcore's trace extension, which reports when the TCP
+    connect and TLS handshake phases of a new connection start and complete.
+    """
+    connects: int
+    total_connect_seconds: float
+    max_connect_seconds: float
+    total_tls_seconds: float
+    max_tls_seconds: float
+
+    def __init__(self):
+        self.connects = 0
+        self.total_connect_seconds = 0.0
+        self.max_connect_seconds = 0.0
+        self.total_tls_seconds = 0.0
+        self.max_tls_seconds = 0.0
+
+    async def on_request(self, request: httpx.Request) -> None:
+        """
+        httpx request hook that attaches a per-request trace callback.
+        """
+        request.extensions["trace"] = self._make_trace()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns the collected timings as a plain dictionary.
+        """
+        return {
+            "connects": self.connects,
+            "avg_connect_ms": self._avg_ms(self.total_connect_seconds),
+            "max_connect_ms": round(self.max_connect_seconds * 1000, 2),
+            "avg_tls_ms": self._avg_ms(self.total_tls_seconds),
+            "max_tls_ms": round(self.max_tls_seconds * 1000, 2),
+        }
+
+    def _make_trace(self):
+        started: Dict[str, float] = {}
+
+        async def trace(event_name: str, info: Dict[str, Any]) -> None:
+            if event_name == "connection.connect_tcp.started":
+                started["tcp"] = time.perf_counter()
+            elif event_name == "connection.connect_tcp.complete" and "tcp" in started:
+                elapsed = time.perf_counter() - started.pop("tcp")
+                self.connects += 1
+                self.total_connect_seconds += elapsed
+                self.max_connect_seconds = max(self.max_connect_seconds, elapsed)
+            elif event_name == "connection.start_tls.started":
+                started["tls"] = time.perf_counter()
+            elif event_name == "connection.start_tls.complete" and "tls" in started:
+                elapsed = time.perf_counter() - started.pop("tls")
+                self.total_tls_seconds += elapsed
+                self.max_tls_seconds = max(self.max_tls_seconds, elapsed)
+
+        return trace
+
+    def _avg_ms(self, total_seconds: float) -> float:
+        if not self.connects:
+            return 0.0
+        return round(total_seconds / self.connects * 1000, 2)
+
+class OpenAIClientManager:
+    """
+    Owns the shared, tuned AsyncOpenAI client and its underlying connection pool.
+    """
+    _settings: Settings
+    _http2: bool
+    _http_client: httpx.AsyncClient
+    _client: AsyncOpenAI
+    _metrics: ConnectionMetrics
+
+    def __init__(self, api_key: str, settings: Settings):
+        """
+        Builds the HTTP client and the AsyncOpenAI client on top of it.
+
+        Args:
+            api_key: The OpenAI API key.
+            settings: Application settings holding the pool and timeout configuration.
+        """
+        self._settings = settings
+        self._metrics = ConnectionMetrics()
+
+        http2 = settings.openai_http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 requested for OpenAI client but the 'h2' package is not installed. Falling back to HTTP/1.1.")
+            http2 = False
+        self._http2 = http2
+
+        timeout = httpx.Timeout(
+            connect=settings.openai_connect_timeout,
+            read=settings.openai_read_timeout,
+            write=settings.openai_write_timeout,
+            pool=settings.openai_pool_timeout,
+        )
+
+        self._http_client = DefaultAsyncHttpxClient(
+            http2=http2,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=settings.openai_max_connections,
+                max_keepalive_connections=settings.openai_max_keepalive_connections,
+                keepalive_expiry=settings.openai_keepalive_expiry,
+            ),
+            event_hooks={"request": [self._metrics.on_request]},
+        )
+
+        # The SDK sends its own timeout with every request, so it must be set here as well.
+        self._client = AsyncOpenAI(
+            api_key=api_key,
+            http_client=self._http_client,
+            timeout=timeout,
+            max_retries=settings.openai_max_retries,
+        )
+        logger.info(
+            "OpenAI client initialized (http2=%s, max_connections=%d).", http2, settings.openai_max_connections
+        )
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        return self._client
+
+    async def warm_up(self) -> None:
+        """
+        Pre-opens connections to the OpenAI API so the first user requests
+        don't pay for DNS, TCP and TLS setup.
+
+        With HTTP/2, concurrent requests are multiplexed over a single connection, so
+        only one request is made; `openai_warmup_connections` applies to HTTP/1.1.
+
+        Failures are logged and swallowed, and the whole warm-up is bounded by
+        `openai_warmup_timeout`, so it never blocks startup for long.
+        """
+        count = self._settings.openai_warmup_connections
+        if count <= 0:
+            return
+        if self._http2:
+            count = 1
+
+        started = time.perf_counter()
+        try:
+            results = await asyncio.wait_for(
+                asyncio.gather(
+                    *(self._client.models.list() for _ in range(count)),
+                    return_exceptions=True,
+                ),
+                timeout=self._settings.openai_warmup_timeout,
+            )
+        except asyncio.TimeoutError:
+            logger.warning("OpenAI client warm-up timed out after %.1fs.", self._settings.openai_warmup_timeout)
+            return
+
+        failures = [r for r in results if isinstance(r, Exception)]
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if failures:
+            logger.warning("OpenAI client warm-up had %d/%d failures: %s", len(failures), count, failures[0])
+        else:
+            logger.info("OpenAI client warmed up %d request(s) in %.0fms.", count, elapsed_ms)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Returns pool utilization and connection setup metrics.
+        """
+        return {
+            "pool": self._pool_snapshot(),
+            "connections": self._metrics.snapshot(),
+        }
+
+    async def aclose(self) -> None:
+        """
+        Closes all pooled connections.
+        """
+        await self._client.close()
+
+    def _pool_snapshot(self) -> Dict[str, Any]:
+        # httpx doesn't expose pool state publicly, so read it from the transport's httpcore pool.
+        pool = getattr(getattr(self._http_client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for conn in connections if conn.is_idle())
+        return {
+            "max_connections": self._settings.openai_max_connections,
+            "open": len(connections),
+            "idle": idle,
+            "active": len(connections) - idle,
+            "utilization": round((len(connections) - idle) / self._settings.openai_max_connections, 3)
+            if self._settings.openai_max_connections else 0.0,
+        }
@@ -7,6 +7,7 @@ from agents import RunContextWrapper, function_tool
 from firebase_admin import firestore
 
 from ..models import AgentContext
+from ..recurrence import RecurrenceError, build_recurrence
 
 
 logger = logging.getLogger(__name__)
@@ -39,7 +40,7 @@ def schedule_reminder(context: RunContextWrapper[AgentContext], datetime_phrase:
             parsed_utc=parsed_utc,
             user_timezone=user_timezone
         )
-        logger.info(f"Reminder for user {user_id} successfully added to Firestore batch.")
+        logger.info("Reminder successfully added to Firestore batch.")
 
         parsed_local = parsed_utc.astimezone(ZoneInfo(user_timezone))
         pretty_local = _format_pretty(parsed_local)
@@ -49,9 +50,61 @@ def schedule_reminder(context: RunContextWrapper[AgentContext], datetime_phrase:
         return str(e)
     
     except Exception as e:
-        logger.error(f"Failed to schedule reminder for user {user_id}: {e}", exc_info=True)
+        logger.error("Failed to schedule reminder: %s", e, exc_info=True)
         return "Something went wrong while setting the reminder."
     
+@function_tool
+def schedule_recurring_reminder(
+    context: RunContextWrapper[AgentContext],
+    start_phrase: str,
+    recurrence_rule: str,
+    reminder_content: str,
+) -> str:
+    """
+    Schedules a reminder that repeats according to an RFC 5545 RRULE.
+
+    Args:
+        start_phrase: When the reminder should first fire, including the time of day (e.g. "tomorrow at 9am").
+        recurrence_rule: An RRULE without DTSTART, e.g. "FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR",
+            "FREQ=DAILY;COUNT=10" or "FREQ=DAILY;UNTIL=20261231T235959Z" (UNTIL in UTC).
+        reminder_content: The content of the reminder.
+    """
+    try:
+        agent_context: AgentContext = context.context
+        user_id = agent_context.user_id
+        user_timezone = agent_context.user_timezone
+        batch = agent_context.firestore_batch
+
+        # The start phrase only anchors the rule; the first occurrence is whatever the rule yields from it.
+        start_utc = _parse_and_validate(start_phrase, user_timezone)
+        start_local = start_utc.astimezone(ZoneInfo(user_timezone))
+        recurrence, first_utc = build_recurrence(recurrence_rule, start_local, user_timezone)
+
+        # A single document holds the rule; only the next occurrence is materialized in `scheduledAt`.
+        _add_reminder_to_batch(
+            batch=batch,
+            user_id=user_id,
+            reminder_content=reminder_content,
+            parsed_utc=first_utc,
+            user_timezone=user_timezone,
+            recurrence=recurrence,
+        )
+        logger.info("Recurring reminder successfully added to Firestore batch.")
+
+        first_local = first_utc.astimezone(ZoneInfo(user_timezone))
+        pretty_local = _format_pretty(first_local)
+        return (
+            f"SUCCESS. Recurring reminder ({recurrence['rrule']}) was scheduled, first on {pretty_local} "
+            f"({user_timezone}). Confirm the details with the user."
+        )
+
+    except (DateParsingError, RecurrenceError) as e:
+        return str(e)
+
+    except Exception as e:
+        logger.error("Failed to schedule recurring reminder: %s", e, exc_info=True)
+        return "Something went wrong while setting the recurring reminder."
+
 # --- Private helper functions ----
     
 def _format_pretty(dt: datetime) -> str:
@@ -114,7 +167,8 @@ def _add_reminder_to_batch(
     user_id: str,
     reminder_content: str,
     parsed_utc: datetime,
-    user_timezone: str
+    user_timezone: str,
+    recurrence: dict | None = None,
 ) -> None:
     """
     Adds a scheduled reminder to a Firestore batch write.
@@ -125,6 +179,7 @@ def _add_reminder_to_batch(
         reminder_content (str): The content/body of the reminder.
         parsed_utc (datetime): The datetime the reminder is scheduled for (in UTC).
         user_timezone (str): The user's local timezone.
+        recurrence (dict | None): The recurrence rule data, for recurring reminders.
 
     Returns:
         None
@@ -141,5 +196,7 @@ def _add_reminder_to_batch(
         "createdAt": firestore.SERVER_TIMESTAMP,
         "userTimezone": user_timezone,
     }
+    if recurrence:
+        reminder_data["recurrence"] = recurrence
 
     batch.set(doc_ref, reminder_data)
\ No newline at end of file